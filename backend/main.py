@@ -1,42 +1,73 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import ORJSONResponse
+import asyncio
+import os
 import uvicorn
 from contextlib import asynccontextmanager
 
+from middleware import PrefixDispatch, TrustedHostASGI
 from routers import auth, chat, faqs, whisper
 from services.db import init_db
+from services.openai import APOLOGY_MESSAGE, HEALTH_REMINDER_FALLBACK, assistant, warmup
+from services.openai_client import close_client
+from services.tts import prewarm_tts_cache
+
+# Seconds the launcher waits for the canned-reply prewarm before starting
+PREWARM_TIMEOUT = 30
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    # Connections are warmed in the background, without delaying startup
+    warm = asyncio.create_task(warmup())
     yield
     # Shutdown
-    pass
+    warm.cancel()
+    await close_client()
+
+
+async def prewarm():
+    """Synthesize canned replies into the shared TTS disk cache"""
+    try:
+        await asyncio.wait_for(
+            prewarm_tts_cache([APOLOGY_MESSAGE, HEALTH_REMINDER_FALLBACK]),
+            PREWARM_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        print("TTS prewarm timed out; canned replies will be synthesized on first use")
+    finally:
+        await close_client()
 
 
 app = FastAPI(
     title="ElderTech Voice Assistant API",
     description="AI-powered voice assistant for elderly care and support",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
+# Lean app for the hot audio/chat paths; lifespan and docs stay on `app`
+rpc_app = FastAPI(openapi_url=None, default_response_class=ORJSONResponse)
+
+CORS_OPTIONS = dict(
     allow_origins=["http://localhost:3000", "http://localhost:3001"],  # Frontend URLs
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# CORS middleware
+app.add_middleware(CORSMiddleware, **CORS_OPTIONS)
+rpc_app.add_middleware(CORSMiddleware, **CORS_OPTIONS)
+
 # Trusted host middleware
 app.add_middleware(
-    TrustedHostMiddleware,
-    allowed_hosts=["localhost", "127.0.0.1"]
+    TrustedHostASGI,
+    hosts=["localhost", "127.0.0.1"]
 )
 
 # Include routers
@@ -45,6 +76,16 @@ app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 app.include_router(faqs.router, prefix="/api/faqs", tags=["FAQs"])
 app.include_router(whisper.router, prefix="/api/whisper", tags=["Speech Processing"])
 
+rpc_app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
+rpc_app.include_router(whisper.router, prefix="/api/whisper", tags=["Speech Processing"])
+
+# Hot paths skip the full stack; added last so it runs outermost
+app.add_middleware(
+    PrefixDispatch,
+    target=rpc_app,
+    prefixes=["/api/whisper", "/api/chat/send"]
+)
+
 
 @app.get("/")
 async def root():
@@ -53,14 +94,35 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "eldertech-voice-assistant"}
+    return {
+        "status": "healthy",
+        "service": "eldertech-voice-assistant",
+        # Per worker process, since each worker has its own assistant
+        "prompt_cache": {
+            "requests": assistant.requests,
+            "prompt_tokens": assistant.prompt_tokens,
+            "cached_prompt_tokens": assistant.cached_prompt_tokens,
+            "hit_rate": round(assistant.prompt_cache_hit_rate, 4)
+        }
+    }
 
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    ) 
\ No newline at end of file
+    host = os.getenv("HOST", "0.0.0.0")
+    port = int(os.getenv("PORT", "8000"))
+    
+    # Once here, not per worker: workers read the phrases from the disk cache
+    asyncio.run(prewarm())
+    
+    if os.getenv("DEV"):
+        # Reload pins a single worker on the default loop; development only
+        uvicorn.run("main:app", host=host, port=port, reload=True, log_level="info")
+    else:
+        uvicorn.run(
+            "main:app",
+            host=host,
+            port=port,
+            workers=int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1)),
+            # loop/http default to "auto": uvloop and httptools when installed
+            log_level="warning"
+        ) 
\ No newline at end of file
@@ -0,0 +1,60 @@
+from typing import Iterable
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class TrustedHostASGI:
+    """Pure ASGI host allowlist gate (drop-in for TrustedHostMiddleware)"""
+
+    def __init__(self, app: ASGIApp, hosts: Iterable[str]):
+        self.app = app
+        self.hosts = frozenset(host.encode("latin-1") for host in hosts)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        # Single pass over the raw header list, no Headers object
+        host = b""
+        for name, value in scope["headers"]:
+            if name == b"host":
+                host = value.split(b":", 1)[0]
+                break
+
+        if host in self.hosts:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["type"] == "websocket":
+            # Closing before accept makes the server reject the handshake
+            await send({"type": "websocket.close", "code": 1008})
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 400,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", b"19"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b"Invalid host header"})
+
+
+class PrefixDispatch:
+    """Send matching HTTP paths to a leaner app, bypassing inner middleware"""
+
+    def __init__(self, app: ASGIApp, target: ASGIApp, prefixes: Iterable[str]):
+        self.app = app
+        self.target = target
+        self.exact = frozenset(prefix.rstrip("/") for prefix in prefixes)
+        self.nested = tuple(prefix + "/" for prefix in self.exact)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            path = scope["path"]
+            if path in self.exact or path.startswith(self.nested):
+                await self.target(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -1,27 +1,97 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 import jwt
 from datetime import datetime, timedelta
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from cachetools import TTLCache
 from passlib.context import CryptContext
+from calendar import timegm
+import base64
+import hashlib
+import hmac
+import orjson
 import os
+import time
 
 from services.db import get_db, User
 
 router = APIRouter()
 security = HTTPBearer()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing (Argon2id; bcrypt is only kept to verify legacy hashes)
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+legacy_pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Recently verified (password, hash) pairs, so rapid repeat logins skip hashing
+_verify_cache = TTLCache(maxsize=10_000, ttl=30)
 
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
-ALGORITHM = "HS256"
+ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+SUPPORTED_ALGORITHMS = frozenset({"HS256", "EdDSA"})
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
 
+def _load_jwt_keys():
+    """Resolve the signing and verification keys once at import"""
+    # Fail at startup rather than with NotImplementedError on every login
+    if ALGORITHM not in SUPPORTED_ALGORITHMS:
+        raise RuntimeError(
+            f"Unsupported JWT_ALGORITHM {ALGORITHM!r}; expected one of "
+            f"{', '.join(sorted(SUPPORTED_ALGORITHMS))}"
+        )
+
+    if ALGORITHM == "EdDSA":
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+        key_path = os.getenv("JWT_PRIVATE_KEY_FILE")
+        if not key_path:
+            raise RuntimeError(
+                "JWT_ALGORITHM=EdDSA requires JWT_PRIVATE_KEY_FILE "
+                "(path to an Ed25519 private key in PEM format)"
+            )
+        with open(key_path, "rb") as key_file:
+            private_key = load_pem_private_key(key_file.read(), password=None)
+        return private_key, private_key.public_key()
+
+    # HMAC: PyJWT takes bytes as-is instead of re-encoding the secret per call
+    secret = SECRET_KEY.encode()
+    return secret, secret
+
+
+SIGNING_KEY, VERIFYING_KEY = _load_jwt_keys()
+
+
+def _b64url(data: bytes) -> str:
+    """Unpadded base64url, as used in JWT segments"""
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+# HS256 fast path: constant header and a keyed HMAC copied per token
+_HS256_HEADER = _b64url(orjson.dumps({"alg": "HS256", "typ": "JWT"}))
+_hmac_template = hmac.new(SECRET_KEY.encode(), digestmod=hashlib.sha256)
+
+
+def _encode_hs256(payload: dict) -> str:
+    """Encode an HS256 JWT without PyJWT's per-call key setup"""
+    for claim in ("exp", "iat", "nbf"):
+        if isinstance(payload.get(claim), datetime):
+            payload[claim] = timegm(payload[claim].utctimetuple())
+    signing_input = f"{_HS256_HEADER}.{_b64url(orjson.dumps(payload))}"
+    signature = _hmac_template.copy()
+    signature.update(signing_input.encode())
+    return f"{signing_input}.{_b64url(signature.digest())}"
+
+# Decoded tokens, keyed by a truncated token digest -> (TokenData, exp)
+_token_cache = TTLCache(maxsize=10_000, ttl=10)
+
+
 class UserCreate(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    
     _id: int
     username: str
     email: str
@@ -32,6 +102,8 @@ class UserCreate(BaseModel):
 
 
 class UserLogin(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    
     email: str
     password: str
 
@@ -45,6 +117,8 @@ class UserResponse(BaseModel):
 
 
 class UserUpdate(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    
     username: Optional[str] = None
     email: Optional[str] = None
     full_name: Optional[str] = None
@@ -64,39 +138,78 @@ class TokenData(BaseModel):
 # Password utilities
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    key = hashlib.blake2b(
+        f"{plain_password}\0{hashed_password}".encode(), digest_size=16
+    ).digest()
+    if _verify_cache.get(key):
+        return True
+
+    if hashed_password.startswith("$argon2"):
+        try:
+            verified = password_hasher.verify(hashed_password, plain_password)
+        except (VerificationError, InvalidHashError):
+            verified = False
+    else:
+        verified = legacy_pwd_context.verify(plain_password, hashed_password)
+
+    # Only successes are cached
+    if verified:
+        _verify_cache[key] = True
+    return verified
 
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Check whether a stored hash should be upgraded after a successful login"""
+    if not hashed_password.startswith("$argon2"):
+        return True
+    return password_hasher.check_needs_rehash(hashed_password)
 
 
 # JWT utilities
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    lifetime = int(expires_delta.total_seconds()) if expires_delta else 15 * 60
+    # NumericDate straight from the clock, no datetime round-trip
+    to_encode["exp"] = int(time.time()) + lifetime
+    if ALGORITHM == "HS256":
+        return _encode_hs256(to_encode)
+    encoded_jwt = jwt.encode(to_encode, SIGNING_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 def verify_token(token: str) -> TokenData:
     """Verify and decode a JWT token"""
+    key = hashlib.sha256(token.encode()).digest()[:16]
+    cached = _token_cache.get(key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, VERIFYING_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         token_data = TokenData(email=email)
-        return token_data
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    # Failures raise above, so only valid tokens are cached
+    _token_cache[key] = (token_data, payload.get("exp", float("inf")))
+    return token_data
+
+
+async def get_token_data(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> TokenData:
+    """Dependency resolving the bearer token to TokenData"""
+    return verify_token(credentials.credentials)
+
 
 @router.post("/register", response_model=UserResponse)
 async def register_user(user_data: UserCreate):
@@ -115,9 +228,8 @@ async def login_user(login_data: UserLogin):
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(token_data: TokenData = Depends(get_token_data)):
     """Get current user information"""
-    # TODO: Implement JWT token validation
     # TODO: Return current user data
     return {"message": "Get current user endpoint"}
 
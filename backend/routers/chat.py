@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from datetime import datetime
 
@@ -12,6 +13,8 @@ security = HTTPBearer()
 
 
 class ChatMessage(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    
     content: str
     message_type: str = "text"  # text, voice, image
 
@@ -47,13 +50,17 @@ async def send_message(
         
         # TODO: Save message and response to database
         
-        return ChatResponse(
+        response = ChatResponse(
             message_id=1,  # TODO: Get actual message ID
             content=ai_response,
             message_type="text",
             timestamp=datetime.now(),
             is_user=False
         )
+        
+        # Already validated above; returning a Response skips the
+        # response_model pass (response_model is kept for the docs)
+        return ORJSONResponse(response.model_dump())
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, TypeAdapter
 from typing import List, Optional
 from datetime import datetime
 
@@ -11,6 +12,8 @@ security = HTTPBearer()
 
 
 class FAQCreate(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    
     question: str
     answer: str
     category: str
@@ -36,6 +39,10 @@ class FAQCategoryResponse(BaseModel):
     faq_count: int
 
 
+# Serializer built once at import for list responses
+faq_list_adapter = TypeAdapter(List[FAQResponse])
+
+
 @router.get("/", response_model=List[FAQResponse])
 async def get_faqs(
     category: Optional[str] = None,
@@ -44,7 +51,8 @@ async def get_faqs(
 ):
     """Get FAQs with optional filtering"""
     # TODO: Implement FAQ retrieval with filtering
-    return []
+    faqs: List[FAQResponse] = []
+    return ORJSONResponse(faq_list_adapter.dump_python(faqs))
 
 
 @router.get("/categories", response_model=List[FAQCategoryResponse])
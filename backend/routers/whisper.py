@@ -1,18 +1,27 @@
 from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
-import io
 
-from services.tts import text_to_speech
-from services.whisper import speech_to_text
+from services.tts import text_to_speech_stream
+from services.whisper import MAX_AUDIO_BYTES, speech_to_text
 
 router = APIRouter()
 security = HTTPBearer()
 
 
+# Upload types accepted by Whisper (parameters such as ";codecs=opus" are stripped)
+ALLOWED_AUDIO_TYPES = frozenset({
+    "audio/mpeg", "audio/mp3", "audio/mp4", "audio/m4a", "audio/x-m4a",
+    "audio/wav", "audio/x-wav", "audio/wave", "audio/webm",
+    "audio/ogg", "audio/flac", "audio/x-flac",
+})
+
+
 class TTSRequest(BaseModel):
+    model_config = ConfigDict(extra="forbid", frozen=True)
+    
     text: str
     voice: str = "alloy"  # alloy, echo, fable, onyx, nova, shimmer
     speed: float = 1.0
@@ -26,23 +35,34 @@ async def convert_speech_to_text(
     """Convert uploaded audio file to text using Whisper"""
     try:
         # Validate file type
-        if not audio_file.content_type.startswith('audio/'):
+        content_type = (audio_file.content_type or "").split(";", 1)[0].strip().lower()
+        if content_type not in ALLOWED_AUDIO_TYPES:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="File must be an audio file"
             )
         
-        # Read audio file
-        audio_content = await audio_file.read()
+        # UploadFile.read runs in the threadpool once Starlette has spooled
+        # the upload to disk; handing the SDK the raw file instead would
+        # read it synchronously on the event loop. One byte past Whisper's
+        # limit is enough to reject oversize uploads without reading them.
+        audio_data = await audio_file.read(MAX_AUDIO_BYTES + 1)
+        if len(audio_data) > MAX_AUDIO_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Audio file exceeds the 25MB limit"
+            )
         
         # Convert speech to text
-        text = await speech_to_text(audio_content)
+        text = await speech_to_text(audio_data)
         
         return {
             "text": text,
             "confidence": 0.95,  # TODO: Get actual confidence from Whisper
             "language": "en"  # TODO: Detect language
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -57,19 +77,16 @@ async def convert_text_to_speech(
 ):
     """Convert text to speech using OpenAI TTS"""
     try:
-        # Convert text to speech
-        audio_data = await text_to_speech(
-            text=request.text,
-            voice=request.voice,
-            speed=request.speed
-        )
-        
-        # Return audio file as streaming response
+        # Stream Opus audio to the client as it is synthesized
         return StreamingResponse(
-            io.BytesIO(audio_data),
-            media_type="audio/mpeg",
+            text_to_speech_stream(
+                text=request.text,
+                voice=request.voice,
+                speed=request.speed
+            ),
+            media_type="audio/ogg",
             headers={
-                "Content-Disposition": "attachment; filename=speech.mp3"
+                "Content-Disposition": "attachment; filename=speech.opus"
             }
         )
     except Exception as e:
@@ -7,101 +7,182 @@ It uses semantic similarity to group related FAQs and identify gaps in knowledge
 """
 
 import asyncio
+import hashlib
 import os
 import sys
+from collections import Counter, defaultdict
 from datetime import datetime
-from typing import List, Dict, Any
-import json
+from typing import List, Dict, Any, AsyncIterator, Iterable, Tuple
+
+import numpy as np
+import orjson
+from diskcache import Cache
+from sentence_transformers import SentenceTransformer
+from sklearn.cluster import MiniBatchKMeans
+from sqlalchemy import select
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from services.db import get_db, FAQ, FAQCategory
-from services.openai import extract_entities, analyze_sentiment
+from services.db import SessionLocal, FAQ, FAQCategory
+
+EMBEDDING_MODEL = os.getenv("FAQ_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+# Embeddings are keyed by model and content, so edits miss naturally; the
+# expiry just lets entries for deleted FAQs age out
+ANALYSIS_CACHE_DIR = os.getenv("FAQ_ANALYSIS_CACHE_DIR", "./cache/faq_embeddings")
+ANALYSIS_CACHE_TTL = 30 * 24 * 60 * 60
 
 
 class FAQClusterer:
     """Handles FAQ clustering and organization"""
     
-    def __init__(self):
+    def __init__(self, cache_dir: str = ANALYSIS_CACHE_DIR, batch_size: int = 64):
         self.clusters = []
+        self.categories = {}
         self.gaps = []
+        self.cache = Cache(cache_dir)
+        self.batch_size = batch_size
+        self._model = None
     
-    async def load_faqs(self, db) -> List[FAQ]:
-        """Load all FAQs from database"""
-        return db.query(FAQ).all()
+    @property
+    def model(self) -> SentenceTransformer:
+        """Sentence embedding model, loaded once on first use"""
+        if self._model is None:
+            self._model = SentenceTransformer(EMBEDDING_MODEL)
+        return self._model
     
-    async def analyze_faq_content(self, faq: FAQ) -> Dict[str, Any]:
-        """Analyze FAQ content for clustering"""
-        try:
-            # Extract entities
-            entities = await extract_entities(faq.question + " " + faq.answer)
-            
-            # Analyze sentiment
-            sentiment = await analyze_sentiment(faq.question + " " + faq.answer)
-            
-            return {
+    async def iter_faq_batches(self, db) -> AsyncIterator[List[FAQ]]:
+        """Stream FAQs from database in batches of batch_size"""
+        result = await db.stream_scalars(
+            select(FAQ).execution_options(yield_per=1000)
+        )
+        async for batch in result.partitions(self.batch_size):
+            yield batch
+    
+    async def analyze_faqs(self, faqs: List[FAQ]) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Embed FAQ content for clustering in one batched encode"""
+        texts = [faq.question + " " + faq.answer for faq in faqs]
+        keys = [
+            hashlib.sha256(f"{EMBEDDING_MODEL}\0{text}".encode()).hexdigest()
+            for text in texts
+        ]
+        embeddings = [self.cache.get(key) for key in keys]
+        
+        # Only new or edited FAQs go through the model
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = self.model.encode(
+                [texts[i] for i in missing],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+                self.cache.set(keys[i], embedding, expire=ANALYSIS_CACHE_TTL)
+        
+        analyzed = [
+            {
                 "id": faq.id,
                 "question": faq.question,
                 "answer": faq.answer,
                 "category": faq.category,
-                "entities": entities,
-                "sentiment": sentiment,
                 "priority": faq.priority
             }
-        except Exception as e:
-            print(f"Error analyzing FAQ {faq.id}: {str(e)}")
-            return None
+            for faq in faqs
+        ]
+        return analyzed, np.asarray(embeddings)
     
-    async def create_clusters(self, faqs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def create_clusters(
+        self,
+        faqs: List[Dict[str, Any]],
+        embeddings: np.ndarray
+    ) -> List[Dict[str, Any]]:
         """Create clusters based on semantic similarity"""
-        # TODO: Implement semantic clustering algorithm
-        # For now, group by category and entities
-        clusters = {}
+        if not faqs:
+            return []
         
+        # One semantic cluster per category on average, so FAQs filed under
+        # the wrong category end up next to their real neighbours
+        n_clusters = min(len(faqs), len({faq["category"] for faq in faqs}))
+        labels = MiniBatchKMeans(
+            n_clusters=n_clusters,
+            batch_size=1024,
+            n_init=3,
+            random_state=0
+        ).fit_predict(embeddings)
+        
+        clusters = defaultdict(list)
+        priority_totals = defaultdict(int)
+        
+        # Single pass: group and accumulate priorities together
+        for faq, label in zip(faqs, labels):
+            clusters[label].append(faq)
+            priority_totals[label] += faq["priority"]
+        
+        results = []
+        for label, members in clusters.items():
+            categories = Counter(faq["category"] for faq in members)
+            results.append({
+                # Named after the dominant category; gaps use per-category stats
+                "name": categories.most_common(1)[0][0],
+                "categories": dict(categories),
+                "faqs": members,
+                "count": len(members),
+                "avg_priority": priority_totals[label] / len(members)
+            })
+        return results
+    
+    async def category_stats(
+        self,
+        faqs: List[Dict[str, Any]],
+        known_categories: Iterable[str] = ()
+    ) -> Dict[str, Dict[str, Any]]:
+        """FAQ count and average priority per category"""
+        counts = Counter()
+        priority_totals = Counter()
+        
+        # Single pass: count and accumulate priorities together
         for faq in faqs:
-            if not faq:
-                continue
-                
-            category = faq["category"]
-            if category not in clusters:
-                clusters[category] = []
-            
-            clusters[category].append(faq)
+            counts[faq["category"]] += 1
+            priority_totals[faq["category"]] += faq["priority"]
         
-        return [
-            {
-                "name": category,
-                "faqs": faqs,
-                "count": len(faqs),
-                "avg_priority": sum(f["priority"] for f in faqs) / len(faqs)
+        # Registered categories without any FAQs are the biggest gaps
+        for category in known_categories:
+            counts.setdefault(category, 0)
+        
+        return {
+            category: {
+                "count": count,
+                "avg_priority": priority_totals[category] / count if count else 0.0
             }
-            for category, faqs in clusters.items()
-        ]
+            for category, count in sorted(counts.items(), key=lambda item: str(item[0]))
+        }
     
-    async def identify_gaps(self, clusters: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    async def identify_gaps(self, categories: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Identify gaps in FAQ coverage"""
         gaps = []
         
         # Check for categories with few FAQs
-        for cluster in clusters:
-            if cluster["count"] < 3:
+        for category, stats in categories.items():
+            if stats["count"] < 3:
                 gaps.append({
                     "type": "low_coverage",
-                    "category": cluster["name"],
-                    "current_count": cluster["count"],
+                    "category": category,
+                    "current_count": stats["count"],
                     "recommended_min": 5,
-                    "description": f"Category '{cluster['name']}' has only {cluster['count']} FAQs"
+                    "description": f"Category '{category}' has only {stats['count']} FAQs"
                 })
         
         # Check for high-priority categories with low priority FAQs
-        for cluster in clusters:
-            if cluster["avg_priority"] < 2 and cluster["count"] > 5:
+        for category, stats in categories.items():
+            if stats["avg_priority"] < 2 and stats["count"] > 5:
                 gaps.append({
                     "type": "low_priority",
-                    "category": cluster["name"],
-                    "avg_priority": cluster["avg_priority"],
-                    "description": f"Category '{cluster['name']}' has low priority FAQs"
+                    "category": category,
+                    "avg_priority": stats["avg_priority"],
+                    "description": f"Category '{category}' has low priority FAQs"
                 })
         
         return gaps
@@ -129,30 +210,29 @@ class FAQClusterer:
         print(f"Starting FAQ clustering at {datetime.now()}")
         
         try:
-            # Get database session
-            db = next(get_db())
-            
-            # Load FAQs
-            print("Loading FAQs from database...")
-            faqs = await self.load_faqs(db)
-            print(f"Loaded {len(faqs)} FAQs")
-            
-            # Analyze FAQ content
-            print("Analyzing FAQ content...")
+            # Stream FAQs and embed each batch as it arrives
+            print("Loading and embedding FAQs...")
             analyzed_faqs = []
-            for faq in faqs:
-                analysis = await self.analyze_faq_content(faq)
-                if analysis:
-                    analyzed_faqs.append(analysis)
+            embedding_batches = []
+            async with SessionLocal() as db:
+                async for batch in self.iter_faq_batches(db):
+                    analyzed, embeddings = await self.analyze_faqs(batch)
+                    analyzed_faqs.extend(analyzed)
+                    embedding_batches.append(embeddings)
+                known_categories = list(await db.scalars(select(FAQCategory.name)))
+            print(f"Embedded {len(analyzed_faqs)} FAQs")
+            
+            embeddings = np.concatenate(embedding_batches) if embedding_batches else None
             
             # Create clusters
             print("Creating clusters...")
-            self.clusters = await self.create_clusters(analyzed_faqs)
+            self.clusters = await self.create_clusters(analyzed_faqs, embeddings)
             print(f"Created {len(self.clusters)} clusters")
             
-            # Identify gaps
+            # Identify gaps from per-category coverage, not from clusters
             print("Identifying gaps...")
-            self.gaps = await self.identify_gaps(self.clusters)
+            self.categories = await self.category_stats(analyzed_faqs, known_categories)
+            self.gaps = await self.identify_gaps(self.categories)
             print(f"Identified {len(self.gaps)} gaps")
             
             # Generate recommendations
@@ -167,25 +247,33 @@ class FAQClusterer:
         except Exception as e:
             print(f"Error during clustering: {str(e)}")
             raise
+        finally:
+            self.cache.close()
     
     async def save_results(self, recommendations: List[str]):
         """Save clustering results"""
         results = {
             "timestamp": datetime.now().isoformat(),
             "clusters": self.clusters,
+            "categories": self.categories,
             "gaps": self.gaps,
             "recommendations": recommendations,
             "summary": {
                 "total_faqs": sum(c["count"] for c in self.clusters),
                 "total_clusters": len(self.clusters),
+                "total_categories": len(self.categories),
                 "total_gaps": len(self.gaps)
             }
         }
         
         # Save to file
         output_file = f"clustering_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(output_file, "w") as f:
-            json.dump(results, f, indent=2, default=str)
+        with open(output_file, "wb") as f:
+            f.write(orjson.dumps(
+                results,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+                default=str
+            ))
         
         print(f"Results saved to {output_file}")
 
@@ -197,4 +285,10 @@ async def main():
 
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+    except ImportError:  # uvicorn[standard] skips uvloop on Windows
+        pass
+    else:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(main()) 
\ No newline at end of file
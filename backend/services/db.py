@@ -1,16 +1,48 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float
+from sqlalchemy import event, select, Column, Index, Integer, String, Text, DateTime, Boolean, ForeignKey, Float
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from typing import Optional
+from typing import AsyncIterator, Optional
 import os
 from datetime import datetime
 
-# Database configuration
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./eldertech.db")
+# Async drivers for plain URLs, so existing DATABASE_URL values keep working
+ASYNC_DRIVERS = {
+    "sqlite://": "sqlite+aiosqlite://",
+    "postgresql://": "postgresql+asyncpg://",
+}
+
+
+def _async_database_url(url: str) -> str:
+    """Map a plain database URL onto its async driver"""
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Database configuration
+DATABASE_URL = _async_database_url(os.getenv("DATABASE_URL", "sqlite:///./eldertech.db"))
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+engine = create_async_engine(DATABASE_URL, pool_pre_ping=True)
+
+if IS_SQLITE:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Enable WAL and relax fsyncs on every new SQLite connection"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256MB
+        cursor.execute("PRAGMA cache_size=-65536")  # 64MB
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -61,6 +93,10 @@ class Message(Base):
     
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
+    
+    __table_args__ = (
+        Index("ix_msg_conv_ts", "conversation_id", "timestamp"),
+    )
 
 
 class FAQ(Base):
@@ -74,6 +110,11 @@ class FAQ(Base):
     priority = Column(Integer, default=1)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        Index("ix_faq_cat_prio", "category", "priority"),
+        Index("ix_faq_updated", "updated_at"),
+    )
 
 
 class FAQCategory(Base):
@@ -97,39 +138,42 @@ class FAQFeedback(Base):
     
     # Relationships
     user = relationship("User", back_populates="faq_feedback")
+    
+    __table_args__ = (
+        Index("ix_fb_faq", "faq_id"),
+    )
 
 
 # Database functions
 async def init_db():
     """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
 
 
-def get_db():
+async def get_db() -> AsyncIterator[AsyncSession]:
     """Get database session"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 # Database utilities
-def create_user(db, user_data):
+async def create_user(db: AsyncSession, user_data):
     """Create a new user"""
     # TODO: Hash password
     db_user = User(**user_data)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
-def get_user_by_email(db, email: str):
+async def get_user_by_email(db: AsyncSession, email: str):
     """Get user by email"""
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
 
-def get_user_by_id(db, user_id: int):
+async def get_user_by_id(db: AsyncSession, user_id: int):
     """Get user by ID"""
-    return db.query(User).filter(User.id == user_id).first() 
\ No newline at end of file
+    return await db.get(User, user_id)
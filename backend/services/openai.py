@@ -1,18 +1,25 @@
-import openai
+import asyncio
 import os
-from typing import Optional, List
+import re
+from collections import deque
+from functools import lru_cache
+from typing import AsyncIterator, Final, Optional, List, Tuple
 import json
 
+from services.openai_client import get_client
+from services.tts import TTS_FORMAT, text_to_speech
+
 # OpenAI configuration
-openai.api_key = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
+# Progressive TTS: flush text at sentence ends, or once a chunk grows this
+# long (small first chunk for fast first audio; TTS input caps at 4096 chars)
+FIRST_TTS_CHUNK_CHARS = 700
+TTS_CHUNK_CHARS = 4000
+_SENTENCE_END_RE = re.compile(r"[.!?](?=\s)")
 
-class ElderTechAssistant:
-    """AI Assistant specialized for elderly care and support"""
-    
-    def __init__(self):
-        self.system_prompt = """
+# Built once at import; the system message is shared by every request
+SYSTEM_PROMPT: Final[str] = """
         You are ElderTech, a compassionate AI voice assistant designed specifically for elderly users. 
         Your role is to provide helpful, supportive, and easy-to-understand assistance.
         
@@ -35,49 +42,195 @@ class ElderTechAssistant:
         
         Always prioritize safety and well-being.
         """
+_SYSTEM_MSG = ({"role": "system", "content": SYSTEM_PROMPT},)
+
+# Conversation turns kept for the prompt (user and assistant messages).
+# When full, the oldest turns are evicted as a block rather than one per
+# request, so the cached prompt prefix stays identical for several turns
+HISTORY_MAX_MESSAGES = 10
+HISTORY_EVICT_MESSAGES = 6
+
+APOLOGY_MESSAGE = "I apologize, but I'm having trouble processing your request right now. Please try again later."
+HEALTH_REMINDER_FALLBACK = "Remember to take care of yourself today!"
+
+# Log the prompt cache hit rate every this many chat requests
+PROMPT_CACHE_LOG_EVERY = 100
+
+
+@lru_cache(maxsize=128)
+def _dump_frozen_context(frozen: tuple) -> str:
+    return json.dumps({key: value for key, value, _ in frozen}, sort_keys=True, separators=(",", ":"))
+
+
+def _dump_context(user_context: dict) -> str:
+    """Serialize a user context deterministically, memoizing repeat contexts"""
+    try:
+        # Value types are part of the key so True, 1 and 1.0 don't collide
+        frozen = tuple(sorted((key, value, type(value)) for key, value in user_context.items()))
+        return _dump_frozen_context(frozen)
+    except TypeError:
+        # Unhashable (nested) values or non-comparable keys
+        return json.dumps(user_context, sort_keys=True, separators=(",", ":"))
+
+
+class ElderTechAssistant:
+    """AI Assistant specialized for elderly care and support"""
+    
+    def __init__(self):
+        self.conversation_history = deque()
+        
+        # Prompt cache accounting (OpenAI caches exact prefixes >= 1024 tokens)
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+    
+    def _build_messages(self, user_message: str, user_context: Optional[dict] = None) -> List[dict]:
+        """Build the chat prompt for a user turn"""
+        # Static prefix first so OpenAI's prompt cache can match it,
+        # volatile parts last
+        messages = list(_SYSTEM_MSG)
+        
+        # Add conversation history (at most HISTORY_MAX_MESSAGES)
+        messages.extend(self.conversation_history)
+        
+        # Add user context if available, after the history and serialized
+        # deterministically so identical contexts are byte-identical
+        if user_context:
+            context_prompt = f"User context: {_dump_context(user_context)}"
+            messages.append({"role": "system", "content": context_prompt})
+        
+        # Add current user message
+        messages.append({"role": "user", "content": user_message})
+        return messages
+    
+    def _remember_turn(self, user_message: str, ai_response: str):
+        """Update conversation history"""
+        if len(self.conversation_history) + 2 > HISTORY_MAX_MESSAGES:
+            for _ in range(HISTORY_EVICT_MESSAGES):
+                self.conversation_history.popleft()
+        self.conversation_history.append({"role": "user", "content": user_message})
+        self.conversation_history.append({"role": "assistant", "content": ai_response})
+    
+    async def _stream_deltas(self, messages: List[dict]) -> AsyncIterator[str]:
+        """Stream reply text deltas from OpenAI, recording token usage"""
+        stream = await get_client().chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=messages,
+            max_tokens=500,
+            temperature=0.7,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
         
-        self.conversation_history = []
+        async for chunk in stream:
+            # The final chunk has no choices and carries the request's usage
+            if chunk.usage is not None:
+                self._record_usage(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
     
-    async def get_response(self, user_message: str, user_context: Optional[dict] = None) -> str:
-        """Get AI response to user message"""
+    async def get_response(self, user_message: str, user_context: Optional[dict] = None) -> AsyncIterator[str]:
+        """Stream AI response to user message, yielding text as it arrives"""
+        reply = []
         try:
-            # Build conversation context
-            messages = [{"role": "system", "content": self.system_prompt}]
+            messages = self._build_messages(user_message, user_context)
             
-            # Add conversation history (last 10 messages)
-            for msg in self.conversation_history[-10:]:
-                messages.append(msg)
+            async for delta in self._stream_deltas(messages):
+                reply.append(delta)
+                yield delta
             
-            # Add user context if available
-            if user_context:
-                context_prompt = f"User context: {json.dumps(user_context)}"
-                messages.append({"role": "system", "content": context_prompt})
+            self._remember_turn(user_message, "".join(reply))
             
-            # Add current user message
-            messages.append({"role": "user", "content": user_message})
-            
-            # Get response from OpenAI
-            response = await openai.ChatCompletion.acreate(
-                model=OPENAI_MODEL,
-                messages=messages,
-                max_tokens=500,
-                temperature=0.7
-            )
+        except Exception as e:
+            # Deltas already sent can't be taken back, so set the apology apart
+            separator = "\n\n" if reply else ""
+            yield f"{separator}{APOLOGY_MESSAGE} Error: {str(e)}"
+    
+    async def get_response_blocking(self, user_message: str, user_context: Optional[dict] = None) -> str:
+        """Get the complete AI response to user message"""
+        return "".join([delta async for delta in self.get_response(user_message, user_context)])
+    
+    async def stream_response(
+        self,
+        user_message: str,
+        user_context: Optional[dict] = None,
+        voice: str = "alloy",
+        speed: float = 1.0,
+        response_format: str = TTS_FORMAT
+    ) -> AsyncIterator[Tuple[str, "asyncio.Task[bytes]"]]:
+        """
+        Stream the AI response, synthesizing speech chunk by chunk
+        
+        TTS for each chunk starts as soon as the chunk is complete, while
+        the model keeps generating. Awaiting the audio tasks in the order
+        they are yielded gives gapless playback.
+        
+        Yields:
+            (text_chunk, audio_task) pairs
+        """
+        reply = []
+        buffer = ""
+        limit = FIRST_TTS_CHUNK_CHARS
+        
+        def flush(text: str) -> Tuple[str, "asyncio.Task[bytes]"]:
+            reply.append(text)
+            return text, asyncio.create_task(text_to_speech(text.strip(), voice, speed, response_format))
+        
+        try:
+            messages = self._build_messages(user_message, user_context)
             
-            ai_response = response.choices[0].message.content
+            async for delta in self._stream_deltas(messages):
+                buffer += delta
+                
+                # Cut after the last complete sentence, or force a cut
+                # once the chunk is too long
+                ends = [match.end() for match in _SENTENCE_END_RE.finditer(buffer)]
+                cut = len(buffer) if len(buffer) >= limit else (ends[-1] if ends else 0)
+                if cut:
+                    yield flush(buffer[:cut])
+                    buffer = buffer[cut:]
+                    limit = TTS_CHUNK_CHARS
             
-            # Update conversation history
-            self.conversation_history.append({"role": "user", "content": user_message})
-            self.conversation_history.append({"role": "assistant", "content": ai_response})
+            if buffer.strip():
+                yield flush(buffer)
             
-            return ai_response
+            self._remember_turn(user_message, "".join(reply).strip())
             
         except Exception as e:
-            return f"I apologize, but I'm having trouble processing your request right now. Please try again later. Error: {str(e)}"
+            print(f"Chat Stream Error: {str(e)}")
+            yield flush(APOLOGY_MESSAGE)
+    
+    def _record_usage(self, usage):
+        """Accumulate prompt and cached prompt token counts"""
+        if usage is None:
+            return
+        # The pinned SDK doesn't type prompt_tokens_details, so it arrives
+        # as a plain dict; newer SDKs return a model
+        details = getattr(usage, "prompt_tokens_details", None)
+        if isinstance(details, dict):
+            cached_tokens = details.get("cached_tokens")
+        else:
+            cached_tokens = getattr(details, "cached_tokens", None)
+        self.prompt_tokens += usage.prompt_tokens
+        self.cached_prompt_tokens += cached_tokens or 0
+        
+        self.requests += 1
+        if self.requests % PROMPT_CACHE_LOG_EVERY == 0:
+            print(
+                f"Prompt cache: {self.prompt_cache_hit_rate:.1%} of "
+                f"{self.prompt_tokens} prompt tokens cached over {self.requests} requests"
+            )
+    
+    @property
+    def prompt_cache_hit_rate(self) -> float:
+        """Share of prompt tokens served from OpenAI's prompt cache"""
+        if not self.prompt_tokens:
+            return 0.0
+        return self.cached_prompt_tokens / self.prompt_tokens
     
     def reset_conversation(self):
         """Reset conversation history"""
-        self.conversation_history = []
+        self.conversation_history.clear()
 
 
 # Global assistant instance
@@ -86,19 +239,79 @@ assistant = ElderTechAssistant()
 
 async def get_ai_response(user_message: str, user_context: Optional[dict] = None) -> str:
     """Get AI response using the ElderTech assistant"""
-    return await assistant.get_response(user_message, user_context)
+    return await assistant.get_response_blocking(user_message, user_context)
+
+
+def stream_ai_response(
+    user_message: str,
+    user_context: Optional[dict] = None,
+    voice: str = "alloy",
+    speed: float = 1.0,
+    response_format: str = TTS_FORMAT
+) -> AsyncIterator[Tuple[str, "asyncio.Task[bytes]"]]:
+    """Stream AI response text with progressively synthesized speech"""
+    return assistant.stream_response(user_message, user_context, voice, speed, response_format)
+
+
+# Structured Outputs schemas: the API guarantees replies that parse
+SENTIMENT_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "sentiment",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "sentiment": {"type": "string", "enum": ["positive", "negative", "neutral"]},
+                "confidence": {"type": "number"}
+            },
+            "required": ["sentiment", "confidence"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Strict schemas need an object root, so the array is wrapped
+ENTITIES_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "entities",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "entities": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "entity": {"type": "string"},
+                            "type": {"type": "string"},
+                            "confidence": {"type": "number"}
+                        },
+                        "required": ["entity", "type", "confidence"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["entities"],
+            "additionalProperties": False
+        }
+    }
+}
 
 
 async def analyze_sentiment(text: str) -> dict:
     """Analyze sentiment of text"""
     try:
-        response = await openai.ChatCompletion.acreate(
+        response = await get_client().chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": "Analyze the sentiment of the following text. Return only a JSON object with 'sentiment' (positive/negative/neutral) and 'confidence' (0-1)."},
                 {"role": "user", "content": text}
             ],
-            max_tokens=100,
+            response_format=SENTIMENT_FORMAT,
+            max_tokens=30,
             temperature=0.1
         )
         
@@ -111,27 +324,42 @@ async def analyze_sentiment(text: str) -> dict:
 async def extract_entities(text: str) -> List[dict]:
     """Extract named entities from text"""
     try:
-        response = await openai.ChatCompletion.acreate(
+        response = await get_client().chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": "Extract named entities (people, places, dates, medical terms) from the text. Return as JSON array of objects with 'entity', 'type', and 'confidence'."},
                 {"role": "user", "content": text}
             ],
+            response_format=ENTITIES_FORMAT,
             max_tokens=200,
             temperature=0.1
         )
         
         result = json.loads(response.choices[0].message.content)
-        return result
+        return result["entities"]
     except Exception as e:
         return []
 
 
+async def analyze_turn(
+    text: str,
+    user_context: Optional[dict] = None
+) -> Tuple[str, dict, List[dict]]:
+    """Get the AI response, sentiment and entities for a user turn concurrently"""
+    # Each call handles its own errors, so one failure doesn't cancel the rest
+    ai_response, sentiment, entities = await asyncio.gather(
+        get_ai_response(text, user_context),
+        analyze_sentiment(text),
+        extract_entities(text)
+    )
+    return ai_response, sentiment, entities
+
+
 async def generate_health_reminder(user_context: dict) -> str:
     """Generate personalized health reminder"""
     try:
-        context = f"User context: {json.dumps(user_context)}"
-        response = await openai.ChatCompletion.acreate(
+        context = f"User context: {_dump_context(user_context)}"
+        response = await get_client().chat.completions.create(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": "Generate a gentle, personalized health reminder based on the user context. Keep it brief and encouraging."},
@@ -143,4 +371,13 @@ async def generate_health_reminder(user_context: dict) -> str:
         
         return response.choices[0].message.content
     except Exception as e:
-        return "Remember to take care of yourself today!" 
\ No newline at end of file
+        return HEALTH_REMINDER_FALLBACK 
+
+async def warmup():
+    """Open a pooled connection to the OpenAI API before first use"""
+    # Listing models is free and authenticated, and chat and TTS share the
+    # api.openai.com pool, so no billed request is needed to warm it
+    try:
+        await get_client().models.list()
+    except Exception as e:
+        print(f"OpenAI Warmup Error: {str(e)}")
@@ -0,0 +1,28 @@
+import os
+from functools import lru_cache
+
+import httpx
+import openai
+
+
+@lru_cache(maxsize=None)
+def get_client() -> openai.AsyncOpenAI:
+    """Shared OpenAI client; one keep-alive connection pool for all services"""
+    return openai.AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=50,
+                keepalive_expiry=60
+            ),
+            timeout=httpx.Timeout(60.0, connect=10.0)
+        )
+    )
+
+
+async def close_client():
+    """Close the shared client's connection pool if it was opened"""
+    if get_client.cache_info().currsize:
+        await get_client().close()
+        get_client.cache_clear()
@@ -1,16 +1,88 @@
-import openai
+import asyncio
+import hashlib
 import os
-from typing import Optional
-import io
+import re
+from typing import AsyncIterator, Iterable, Optional, Tuple
 
-# OpenAI configuration
-openai.api_key = os.getenv("OPENAI_API_KEY")
+import aiofiles
+from cachetools import LRUCache
+
+from services.openai_client import get_client
+
+# Synthesized audio, content-addressed by voice/speed/format/text: an LRU
+# in memory bounded by total bytes, plus an on-disk tier shared between
+# workers that only holds canned phrases (written with persist=True), so
+# it stays small and never stores users' conversation audio
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "audio/cache")
+TTS_MEMORY_CACHE_BYTES = 32 * 1024 * 1024
+_tts_cache = LRUCache(maxsize=TTS_MEMORY_CACHE_BYTES, getsizeof=len)
+
+# Punctuation not already followed by whitespace, and whitespace runs
+_PUNCTUATION_RE = re.compile(r"([.!?,])(?!\s)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# One format everywhere (Opus: small and natively framed for streaming), so
+# prewarmed, streamed and chunked audio all share cache entries
+TTS_FORMAT = "opus"
+
+VALID_VOICES = frozenset({"alloy", "echo", "fable", "onyx", "nova", "shimmer"})
+
+
+def _validate_voice_params(voice: str, speed: float) -> Tuple[str, float]:
+    """Fall back to defaults for unknown voices and out-of-range speeds"""
+    if voice not in VALID_VOICES:
+        voice = "alloy"
+    if speed < 0.25 or speed > 4.0:
+        speed = 1.0
+    return voice, speed
+
+
+def _cache_entry(text: str, voice: str, speed: float, response_format: str) -> Tuple[str, str]:
+    """Cache key and disk-tier path for a synthesis request"""
+    key = hashlib.sha256(f"{voice}|{speed}|{response_format}|{text}".encode()).hexdigest()
+    return key, os.path.join(TTS_CACHE_DIR, f"{key}.{response_format}")
+
+
+def _cache_audio(key: str, audio_data: bytes):
+    """Keep audio in the memory tier, unless it alone exceeds the budget"""
+    if len(audio_data) <= _tts_cache.maxsize:
+        _tts_cache[key] = audio_data
+
+
+async def _read_cache(key: str, cache_path: str) -> Optional[bytes]:
+    """Look up synthesized audio in memory, then on disk"""
+    audio_data = _tts_cache.get(key)
+    if audio_data is None and os.path.exists(cache_path):
+        async with aiofiles.open(cache_path, "rb") as f:
+            audio_data = await f.read()
+        _cache_audio(key, audio_data)
+    return audio_data
+
+
+async def _write_disk_cache(cache_path: str, audio_data: bytes):
+    """Best-effort write to the disk tier; the audio is still returned on failure"""
+    # Write then rename, so other workers never read a partial file
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+        async with aiofiles.open(temp_path, "wb") as f:
+            await f.write(audio_data)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"TTS Cache Write Error: {str(e)}")
+        # Don't leave a partial temp file behind
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
 
 
 async def text_to_speech(
     text: str,
     voice: str = "alloy",
-    speed: float = 1.0
+    speed: float = 1.0,
+    response_format: str = TTS_FORMAT,
+    persist: bool = False
 ) -> bytes:
     """
     Convert text to speech using OpenAI TTS
@@ -19,31 +91,39 @@ async def text_to_speech(
         text: Text to convert to speech
         voice: Voice to use (alloy, echo, fable, onyx, nova, shimmer)
         speed: Speed of speech (0.25 to 4.0)
+        response_format: Audio format (mp3, opus, aac, flac, wav, pcm)
+        persist: Also write the audio to the disk tier (canned phrases only)
     
     Returns:
         Audio data as bytes
     """
     try:
-        # Validate voice parameter
-        valid_voices = ["alloy", "echo", "fable", "onyx", "nova", "shimmer"]
-        if voice not in valid_voices:
-            voice = "alloy"
+        # Validate voice and speed parameters
+        voice, speed = _validate_voice_params(voice, speed)
         
-        # Validate speed parameter
-        if speed < 0.25 or speed > 4.0:
-            speed = 1.0
+        # Serve repeated phrases from the cache
+        key, cache_path = _cache_entry(text, voice, speed, response_format)
+        audio_data = await _read_cache(key, cache_path)
+        if audio_data is not None:
+            return audio_data
         
         # Generate speech using OpenAI TTS
-        response = await openai.Audio.acreate(
+        response = await get_client().audio.speech.create(
             model="tts-1",
             voice=voice,
             input=text,
-            speed=speed
+            speed=speed,
+            response_format=response_format
         )
         
         # Read audio data
         audio_data = response.content
         
+        if audio_data:
+            _cache_audio(key, audio_data)
+            if persist:
+                await _write_disk_cache(cache_path, audio_data)
+        
         return audio_data
         
     except Exception as e:
@@ -55,27 +135,69 @@ async def text_to_speech(
 async def text_to_speech_stream(
     text: str,
     voice: str = "alloy",
-    speed: float = 1.0
-):
+    speed: float = 1.0,
+    response_format: str = TTS_FORMAT,
+    chunk_size: int = 4096
+) -> AsyncIterator[bytes]:
     """
-    Convert text to speech and return as streaming response
+    Convert text to speech, yielding audio chunks as they are synthesized
+    
+    Cached audio is replayed in chunks; a completed synthesis is cached
+    in memory.
     
     Args:
         text: Text to convert to speech
         voice: Voice to use
         speed: Speed of speech
+        response_format: Audio format (opus, mp3, aac, flac, wav, pcm)
+        chunk_size: Bytes per yielded chunk
     
-    Returns:
-        StreamingResponse with audio data
+    Yields:
+        Audio data chunks
     """
+    voice, speed = _validate_voice_params(voice, speed)
+    key, cache_path = _cache_entry(text, voice, speed, response_format)
+    
     try:
-        audio_data = await text_to_speech(text, voice, speed)
+        audio_data = await _read_cache(key, cache_path)
+        if audio_data is not None:
+            for start in range(0, len(audio_data), chunk_size):
+                yield audio_data[start:start + chunk_size]
+            return
+        
+        chunks = []
+        async with get_client().audio.speech.with_streaming_response.create(
+            model="tts-1",
+            voice=voice,
+            input=text,
+            speed=speed,
+            response_format=response_format
+        ) as response:
+            async for chunk in response.iter_bytes(chunk_size=chunk_size):
+                chunks.append(chunk)
+                yield chunk
         
-        return io.BytesIO(audio_data)
+        # Only reached when the whole stream was sent, so no partial audio
+        audio_data = b"".join(chunks)
+        if audio_data:
+            _cache_audio(key, audio_data)
         
     except Exception as e:
+        # Headers are already sent by now, so end the stream early
         print(f"TTS Stream Error: {str(e)}")
-        return io.BytesIO(b"")
+
+
+async def prewarm_tts_cache(
+    phrases: Iterable[str],
+    voice: str = "alloy",
+    speed: float = 1.0,
+    response_format: str = TTS_FORMAT
+):
+    """Synthesize canned phrases ahead of time so they are served from cache"""
+    await asyncio.gather(*(
+        text_to_speech(phrase, voice, speed, response_format, persist=True)
+        for phrase in phrases
+    ))
 
 
 def get_available_voices() -> list:
@@ -120,7 +242,7 @@ def get_available_voices() -> list:
     ]
 
 
-async def optimize_text_for_speech(text: str) -> str:
+def optimize_text_for_speech(text: str) -> str:
     """
     Optimize text for better speech synthesis
     
@@ -130,26 +252,16 @@ async def optimize_text_for_speech(text: str) -> str:
     Returns:
         Optimized text for TTS
     """
-    # Basic text optimization for TTS
-    optimized = text.strip()
-    
-    # Add pauses for better speech flow
-    optimized = optimized.replace(".", ". ")
-    optimized = optimized.replace("!", "! ")
-    optimized = optimized.replace("?", "? ")
-    optimized = optimized.replace(",", ", ")
-    
-    # Remove extra whitespace
-    optimized = " ".join(optimized.split())
-    
-    return optimized
+    # Add pauses after punctuation, then collapse whitespace
+    return _WHITESPACE_RE.sub(" ", _PUNCTUATION_RE.sub(r"\1 ", text)).strip()
 
 
 async def create_audio_file(
     text: str,
     voice: str = "alloy",
     speed: float = 1.0,
-    filename: Optional[str] = None
+    filename: Optional[str] = None,
+    response_format: str = TTS_FORMAT
 ) -> str:
     """
     Create an audio file from text
@@ -159,17 +271,18 @@ async def create_audio_file(
         voice: Voice to use
         speed: Speed of speech
         filename: Optional filename (without extension)
+        response_format: Audio format, also used as the file extension
     
     Returns:
         Path to created audio file
     """
     try:
-        audio_data = await text_to_speech(text, voice, speed)
+        audio_data = await text_to_speech(text, voice, speed, response_format)
         
         if not filename:
             filename = f"speech_{voice}_{int(speed * 100)}"
         
-        filepath = f"audio/{filename}.mp3"
+        filepath = f"audio/{filename}.{response_format}"
         
         # Ensure audio directory exists
         os.makedirs("audio", exist_ok=True)
@@ -1,15 +1,58 @@
-import openai
-import os
-from typing import Optional, Dict, Any
-import tempfile
-import io
+import asyncio
+import hashlib
+from typing import Optional, Dict, Any, BinaryIO, Tuple, Union
 
-# OpenAI configuration
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from cachetools import TTLCache
+
+from services.openai_client import get_client
+
+# Known container signatures -> (extension, mimetype), so Whisper picks the
+# right decoder; anything else fails validate_audio_format
+AUDIO_SIGNATURES = (
+    (b"RIFF", ("wav", "audio/wav")),
+    (b"ID3", ("mp3", "audio/mpeg")),
+    (b"OggS", ("ogg", "audio/ogg")),
+    (b"fLaC", ("flac", "audio/flac")),
+    (b"\x1a\x45\xdf\xa3", ("webm", "audio/webm")),
+)
+
+# Whisper upload limit
+MAX_AUDIO_BYTES = 25 * 1024 * 1024
+
+# Recent verbose transcriptions, keyed by (audio digest, language, prompt,
+# word_level), so detect_language and a later metadata transcription share
+# one Whisper call
+_metadata_cache = TTLCache(maxsize=256, ttl=300)
+
+
+def _detect_container(header: bytes) -> Optional[Tuple[str, str]]:
+    """(extension, mimetype) of a known audio container, from its first bytes"""
+    # MP4/M4A carries its signature at offset 4
+    if header[4:8] == b"ftyp":
+        return "m4a", "audio/mp4"
+    # Untagged MP3: 11-bit frame sync, then Layer III (any MPEG version, CRC or not)
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0 and header[1] & 0x06 == 0x02:
+        return "mp3", "audio/mpeg"
+    for signature, detected in AUDIO_SIGNATURES:
+        if header.startswith(signature):
+            return detected
+    return None
+
+
+def _audio_upload(audio_data: Union[bytes, BinaryIO]) -> Tuple[str, Union[bytes, BinaryIO], str]:
+    """Build an in-memory (filename, content, mimetype) upload for Whisper"""
+    if isinstance(audio_data, bytes):
+        header = audio_data[:12]
+    else:
+        header = audio_data.read(12)
+        audio_data.seek(0)
+    
+    extension, mimetype = _detect_container(header) or ("wav", "audio/wav")
+    return f"audio.{extension}", audio_data, mimetype
 
 
 async def speech_to_text(
-    audio_data: bytes,
+    audio_data: Union[bytes, BinaryIO],
     language: Optional[str] = None,
     prompt: Optional[str] = None
 ) -> str:
@@ -17,7 +60,7 @@ async def speech_to_text(
     Convert speech to text using OpenAI Whisper
     
     Args:
-        audio_data: Audio file data as bytes
+        audio_data: Audio file data as bytes or a binary file object
         language: Language code (e.g., 'en', 'es', 'fr')
         prompt: Optional prompt to guide transcription
     
@@ -25,34 +68,24 @@ async def speech_to_text(
         Transcribed text
     """
     try:
-        # Create temporary file for audio data
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            temp_file.write(audio_data)
-            temp_file_path = temp_file.name
+        # Prepare parameters for Whisper API
+        params = {
+            "model": "whisper-1",
+            "file": _audio_upload(audio_data),
+            "response_format": "text"
+        }
+        
+        # Add optional parameters
+        if language:
+            params["language"] = language
+        if prompt:
+            params["prompt"] = prompt
+        
+        # Call Whisper API
+        response = await get_client().audio.transcriptions.create(**params)
+        
+        return response
         
-        try:
-            # Prepare parameters for Whisper API
-            params = {
-                "model": "whisper-1",
-                "file": open(temp_file_path, "rb"),
-                "response_format": "text"
-            }
-            
-            # Add optional parameters
-            if language:
-                params["language"] = language
-            if prompt:
-                params["prompt"] = prompt
-            
-            # Call Whisper API
-            response = await openai.Audio.atranscribe(**params)
-            
-            return response
-            
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-            
     except Exception as e:
         print(f"Whisper Error: {str(e)}")
         return ""
@@ -61,7 +94,8 @@ async def speech_to_text(
 async def speech_to_text_with_metadata(
     audio_data: bytes,
     language: Optional[str] = None,
-    prompt: Optional[str] = None
+    prompt: Optional[str] = None,
+    word_level: bool = False
 ) -> Dict[str, Any]:
     """
     Convert speech to text with additional metadata
@@ -70,45 +104,53 @@ async def speech_to_text_with_metadata(
         audio_data: Audio file data as bytes
         language: Language code
         prompt: Optional prompt
+        word_level: Also request word-level timestamps (slower)
     
     Returns:
         Dictionary with text and metadata
     """
+    key = (hashlib.sha256(audio_data).digest(), language, prompt, word_level)
+    cached = _metadata_cache.get(key)
+    if cached is not None:
+        return dict(cached)
+    
     try:
-        # Create temporary file for audio data
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            temp_file.write(audio_data)
-            temp_file_path = temp_file.name
+        # Prepare parameters for Whisper API
+        params = {
+            "model": "whisper-1",
+            "file": _audio_upload(audio_data),
+            "response_format": "verbose_json"
+        }
+        
+        # Add optional parameters
+        if language:
+            params["language"] = language
+        if prompt:
+            params["prompt"] = prompt
+        if word_level:
+            params["timestamp_granularities"] = ["word", "segment"]
+        
+        # Call Whisper API
+        response = await get_client().audio.transcriptions.create(**params)
+        
+        # Keep only the segment fields used downstream; verbose_json also
+        # carries token ids, logprobs and other per-segment decoder stats
+        result = {
+            "text": response.text,
+            "language": response.language,
+            "duration": response.duration,
+            "segments": [
+                {"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+                for segment in response.segments or []
+            ],
+            "confidence": response.confidence if hasattr(response, 'confidence') else None
+        }
+        if word_level:
+            result["words"] = getattr(response, "words", None) or []
+        _metadata_cache[key] = result
+        
+        return dict(result)
         
-        try:
-            # Prepare parameters for Whisper API
-            params = {
-                "model": "whisper-1",
-                "file": open(temp_file_path, "rb"),
-                "response_format": "verbose_json"
-            }
-            
-            # Add optional parameters
-            if language:
-                params["language"] = language
-            if prompt:
-                params["prompt"] = prompt
-            
-            # Call Whisper API
-            response = await openai.Audio.atranscribe(**params)
-            
-            return {
-                "text": response.text,
-                "language": response.language,
-                "duration": response.duration,
-                "segments": response.segments,
-                "confidence": response.confidence if hasattr(response, 'confidence') else None
-            }
-            
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-            
     except Exception as e:
         print(f"Whisper Metadata Error: {str(e)}")
         return {
@@ -131,29 +173,9 @@ async def detect_language(audio_data: bytes) -> str:
     Returns:
         Language code (e.g., 'en', 'es', 'fr')
     """
-    try:
-        # Create temporary file for audio data
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            temp_file.write(audio_data)
-            temp_file_path = temp_file.name
-        
-        try:
-            # Call Whisper API for language detection
-            response = await openai.Audio.atranscribe(
-                model="whisper-1",
-                file=open(temp_file_path, "rb"),
-                response_format="verbose_json"
-            )
-            
-            return response.language
-            
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-            
-    except Exception as e:
-        print(f"Language Detection Error: {str(e)}")
-        return "en"  # Default to English
+    # Reuses (and primes) the cached metadata transcription
+    metadata = await speech_to_text_with_metadata(audio_data)
+    return metadata["language"] or "en"  # Default to English
 
 
 async def transcribe_with_timestamps(audio_data: bytes) -> list:
@@ -185,56 +207,45 @@ def validate_audio_format(audio_data: bytes) -> bool:
     Returns:
         True if format is valid
     """
-    # Check if data is not empty
-    if not audio_data:
+    # Check emptiness and file size (Whisper has a 25MB limit)
+    if not audio_data or len(audio_data) > MAX_AUDIO_BYTES:
         return False
     
-    # Check file size (Whisper has a 25MB limit)
-    if len(audio_data) > 25 * 1024 * 1024:
-        return False
-    
-    # Basic format validation (check for common audio headers)
-    audio_headers = [
-        b'RIFF',  # WAV
-        b'ID3',   # MP3
-        b'\xff\xfb',  # MP3
-        b'OggS',  # OGG
-        b'fLaC',  # FLAC
-    ]
-    
-    for header in audio_headers:
-        if audio_data.startswith(header):
-            return True
-    
-    return True  # Assume valid if no specific header found
+    # Known container headers only; anything else is rejected
+    return _detect_container(audio_data[:12]) is not None
 
 
-async def batch_transcribe(audio_files: list) -> list:
+async def batch_transcribe(audio_files: list, max_concurrency: int = 10) -> list:
     """
     Transcribe multiple audio files
     
     Args:
         audio_files: List of audio file data as bytes
+        max_concurrency: Maximum Whisper requests in flight
     
     Returns:
         List of transcription results
     """
-    results = []
-    
-    for i, audio_data in enumerate(audio_files):
-        try:
-            text = await speech_to_text(audio_data)
-            results.append({
-                "file_index": i,
-                "text": text,
-                "success": True
-            })
-        except Exception as e:
-            results.append({
-                "file_index": i,
-                "text": "",
-                "success": False,
-                "error": str(e)
-            })
-    
-    return results 
\ No newline at end of file
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def transcribe(i: int, audio_data: bytes) -> dict:
+        async with semaphore:
+            try:
+                text = await speech_to_text(audio_data)
+                return {
+                    "file_index": i,
+                    "text": text,
+                    "success": True
+                }
+            except Exception as e:
+                return {
+                    "file_index": i,
+                    "text": "",
+                    "success": False,
+                    "error": str(e)
+                }
+    
+    # gather preserves input order, so results line up with file_index
+    return list(await asyncio.gather(
+        *(transcribe(i, audio_data) for i, audio_data in enumerate(audio_files))
+    ))
@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletionChunk
+
+from services import openai as openai_service
+
+
+def _usage(prompt_tokens: int, cached_tokens: int) -> CompletionUsage:
+    return CompletionUsage.model_validate({
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": 1,
+        "total_tokens": prompt_tokens + 1,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens}
+    })
+
+
+def _chunk(content=None, usage=None) -> ChatCompletionChunk:
+    choices = []
+    if content is not None:
+        choices = [{"index": 0, "delta": {"content": content}, "finish_reason": None}]
+    return ChatCompletionChunk.model_validate({
+        "id": "chatcmpl-test",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": choices,
+        "usage": usage
+    })
+
+
+def _fake_client(chunks, error=None):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+        if error is not None:
+            raise error
+
+    async def create(**kwargs):
+        assert kwargs["stream_options"] == {"include_usage": True}
+        return stream()
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def test_record_usage_reads_untyped_prompt_tokens_details():
+    assistant = openai_service.ElderTechAssistant()
+    assistant._record_usage(_usage(2048, 1536))
+    
+    assert assistant.prompt_tokens == 2048
+    assert assistant.cached_prompt_tokens == 1536
+    assert assistant.prompt_cache_hit_rate == 0.75
+
+
+def test_record_usage_reads_typed_prompt_tokens_details():
+    assistant = openai_service.ElderTechAssistant()
+    usage = SimpleNamespace(prompt_tokens=100, prompt_tokens_details=SimpleNamespace(cached_tokens=40))
+    assistant._record_usage(usage)
+    
+    assert assistant.cached_prompt_tokens == 40
+
+
+def test_streamed_usage_chunk_is_recorded(monkeypatch):
+    chunks = [_chunk("Hello"), _chunk(" there."), _chunk(usage=_usage(1200, 1024).model_dump())]
+    monkeypatch.setattr(openai_service, "get_client", lambda: _fake_client(chunks))
+    assistant = openai_service.ElderTechAssistant()
+    
+    reply = asyncio.run(assistant.get_response_blocking("hi"))
+    
+    assert reply == "Hello there."
+    assert assistant.prompt_tokens == 1200
+    assert assistant.cached_prompt_tokens == 1024
+
+
+def test_mid_stream_failure_separates_apology(monkeypatch):
+    chunks = [_chunk("Hello"), _chunk(" there")]
+    monkeypatch.setattr(
+        openai_service, "get_client", lambda: _fake_client(chunks, error=RuntimeError("boom"))
+    )
+    assistant = openai_service.ElderTechAssistant()
+    
+    reply = asyncio.run(assistant.get_response_blocking("hi"))
+    
+    assert reply == f"Hello there\n\n{openai_service.APOLOGY_MESSAGE} Error: boom"
+    assert not assistant.conversation_history
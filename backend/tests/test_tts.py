@@ -0,0 +1,41 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+from services import tts
+
+
+def _fake_client(calls):
+    async def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(content=b"audio:" + kwargs["input"].encode())
+
+    return SimpleNamespace(audio=SimpleNamespace(speech=SimpleNamespace(create=create)))
+
+
+def test_only_persisted_phrases_reach_the_disk_tier(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(tts, "TTS_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(tts, "_tts_cache", tts.LRUCache(maxsize=1024, getsizeof=len))
+    monkeypatch.setattr(tts, "get_client", lambda: _fake_client(calls))
+    
+    asyncio.run(tts.text_to_speech("Private reply", response_format="opus"))
+    asyncio.run(tts.prewarm_tts_cache(["Canned phrase"]))
+    
+    assert [path.suffix for path in tmp_path.iterdir()] == [".opus"]
+    key, cache_path = tts._cache_entry("Canned phrase", "alloy", 1.0, "opus")
+    assert os.path.exists(cache_path)
+
+
+def test_memory_tier_is_bounded_by_bytes(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(tts, "TTS_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(tts, "_tts_cache", tts.LRUCache(maxsize=40, getsizeof=len))
+    monkeypatch.setattr(tts, "get_client", lambda: _fake_client(calls))
+    
+    for text in ("one", "two", "three", "four", "a phrase longer than the whole budget"):
+        audio_data = asyncio.run(tts.text_to_speech(text))
+        assert audio_data == b"audio:" + text.encode()
+    
+    assert tts._tts_cache.currsize <= 40
+    assert len(calls) == 5
@@ -0,0 +1,23 @@
+import pytest
+
+from services.whisper import _audio_upload, validate_audio_format
+
+
+@pytest.mark.parametrize("header", [
+    b"ID3\x04",
+    b"\xff\xfb\x90\x00",  # MPEG-1 Layer III
+    b"\xff\xfa\x90\x00",  # MPEG-1 Layer III with CRC
+    b"\xff\xf3\x64\x00",  # MPEG-2 Layer III
+    b"\xff\xf2\x64\x00",  # MPEG-2 Layer III with CRC
+    b"\xff\xe3\x64\x00",  # MPEG-2.5 Layer III
+])
+def test_mp3_is_accepted_and_labelled(header):
+    audio_data = header + b"\x00" * 64
+    
+    assert validate_audio_format(audio_data)
+    assert _audio_upload(audio_data)[0] == "audio.mp3"
+
+
+@pytest.mark.parametrize("header", [b"\xff\xf1\x50\x80", b"\xff\xfd\x90\x00", b"text"])
+def test_unknown_audio_is_rejected(header):
+    assert not validate_audio_format(header + b"\x00" * 64)